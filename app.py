@@ -1,15 +1,37 @@
 import streamlit as st
 import os
-from groq import Groq
-from dotenv import load_dotenv
+import asyncio
+import hashlib
 import re
+import sqlite3
+import threading
+import time
+import types
+import uuid
+import warnings
+from collections import Counter, OrderedDict, deque
+from contextlib import closing
+from pathlib import Path
 
 
-load_dotenv()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Settings from the environment / .env, parsed once per process
+@st.cache_resource
+def _config():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return types.SimpleNamespace(groq_api_key=os.getenv("GROQ_API_KEY"))
+
+
+# Groq client, created once per process and shared across reruns. The Groq
+# SDK (httpx, pydantic) is imported on first use so the UI can render before
+# it loads.
+@st.cache_resource
+def get_groq_client():
+    from groq import Groq
+
+    return Groq(api_key=_config().groq_api_key)
 
-# Initialize Groq client
-client = Groq(api_key=GROQ_API_KEY)
 
 # LLM models
 MODEL_OPTIONS = [
@@ -18,188 +40,437 @@ MODEL_OPTIONS = [
     "deepseek-r1-distill-llama-70b"
 ]
 
-# Few-shot REGO examples
-few_shot_examples = """
-Example 1:
-Policy Description:
-Allow access to users with the role "admin".
+# Descriptions shorter than this are rejected before calling the API
+MIN_PROMPT_LENGTH = 10
 
-REGO Policy:
-package authz
+# Ready-made policies for the most common demo prompts, keyed by the
+# normalized description (see _normalize_prompt); these skip the API entirely
+_ADMIN_POLICY = """package authz
 
 default allow = false
 
 allow {
     input.role == "admin"
-}
+}"""
 
----
+LOCAL_POLICIES = {
+    "allow admins": _ADMIN_POLICY,
+    "allow admin role": _ADMIN_POLICY,
+    "allow only admins": _ADMIN_POLICY,
+    'allow access to users with the role "admin"': _ADMIN_POLICY,
+    "deny all": """package authz
 
-Example 2:
-Policy Description:
-Deny all IP addresses not in the allowed list.
+default allow = false""",
+    "allow all": """package authz
 
-REGO Policy:
-package network
-
-default allow = false
-
-allow {
-    input.ip == "192.168.1.1"
-} {
-    input.ip == "10.0.0.2"
+default allow = true""",
 }
 
----
-
-Example 3:
-Policy Description:
-Approve requests only if the request time is between 9AM and 5PM.
+# Features reported in the Policy Analysis panel, matched in a single pass
+# regardless of how many patterns are listed
+ANALYSIS_PATTERNS = (
+    "default allow = false",
+    "package ",
+    "input.",
+    "future.keywords",
+    "io.jwt",
+    "time.now_ns",
+)
+_ANALYSIS_RE = re.compile("|".join(map(re.escape, ANALYSIS_PATTERNS)))
+
+# Few-shot REGO examples, kept in prompts/ alongside the code. Streamlit
+# re-executes this script on every rerun, so the file is read through
+# st.cache_resource to share one copy per process.
+@st.cache_resource
+def _few_shot() -> str:
+    return (Path(__file__).parent / "prompts" / "few_shot.txt").read_text(encoding="utf-8")
+
+
+FEW_SHOT_EXAMPLES = _few_shot()
+
+
+# Static system prompt: kept identical across requests so provider-side
+# prompt caching can reuse the few-shot prefix. Only the policy description
+# goes in the user message.
+SYSTEM_MSG = (
+    "You are an expert REGO policy writer. Output only valid REGO code.\n\n"
+    "You are a cybersecurity expert specializing in Open Policy Agent (OPA) and REGO policies.\n\n"
+    "Use the following examples to understand the style and structure.\n"
+    + FEW_SHOT_EXAMPLES
+    + "\nFor each new Policy Description, generate a REGO policy.\n"
+    "Follow these guidelines:\n"
+    "1. Include proper package declaration\n"
+    "2. Set default allow = false when appropriate\n"
+    "3. Use clear, descriptive rule names\n"
+    "4. Include all necessary conditions\n"
+    "5. Format for readability\n\n"
+    "Only output the REGO code block. No explanation, no extra text and diplsaying your thinking."
+)
 
-REGO Policy:
-package timebased
+# Shared by every request; the Groq SDK does not mutate message dicts
+SYSTEM_MSG_DICT = {"role": "system", "content": SYSTEM_MSG}
 
-default allow = false
-
-allow {
-    input.time >= 9
-    input.time <= 17
-}
+# Providers only cache prompt prefixes above a minimum length (commonly 1024
+# tokens), so edits to the examples should keep SYSTEM_MSG above it.
+PROMPT_CACHE_MIN_TOKENS = 1024
 
----
 
-Example 4:
-Policy Description:
-Complex hierarchical authorization - Allow access if user is either:
-1. An admin in any department, OR
-2. A manager in the same department as the resource
+def _check_prompt_cache_prefix():
+    """Warn if SYSTEM_MSG is too short to be prefix-cached."""
+    try:
+        import tiktoken
+        n_tokens = len(tiktoken.get_encoding("cl100k_base").encode(SYSTEM_MSG))
+    except Exception:  # tiktoken not installed, or its encoding can't be fetched
+        return None
+    if n_tokens < PROMPT_CACHE_MIN_TOKENS:
+        warnings.warn(
+            f"SYSTEM_MSG is {n_tokens} tokens, below the {PROMPT_CACHE_MIN_TOKENS}-token "
+            "minimum for provider prompt caching"
+        )
+    return n_tokens
 
-REGO Policy:
-package hierarchical_authz
 
-default allow = false
+# Informational only, and tiktoken may fetch its encoding over the network on
+# first use, so the check runs once per process off the request path
+@st.cache_resource
+def _start_prompt_cache_check():
+    thread = threading.Thread(target=_check_prompt_cache_prefix, daemon=True)
+    thread.start()
+    return thread
 
-allow {
-    input.user.roles[_] == "admin"
-} {
-    input.user.roles[_] == "manager"
-    input.user.department == input.resource.department
-}
 
----
+_start_prompt_cache_check()
 
-Example 5:
-Policy Description:
-Validate JWT tokens with RS256 signature and check claims:
-1. Token must be valid and not expired
-2. Audience must match our service
-3. Must have either "read:data" or "write:data" scope
 
-REGO Policy:
-package jwt_authz
+# Sampling temperature for every generation request
+TEMPERATURE = 0.2
 
-import future.keywords.in
+# Per-request user message; the only part of the prompt filled in per click.
+USER_MSG_TEMPLATE = 'Policy Description:\n"""\n{user_prompt}\n"""'
 
-default allow = false
 
-allow {
-    [valid, _, _] := io.jwt.decode_verify(input.jwt, {
-        "cert": input.cert,
-        "alg": "RS256"
-    })
-    valid
-    now := time.now_ns() / 1000000000
-    payload := io.jwt.decode(input.jwt)[1]
-    payload.exp >= now
-    payload.aud == "my-service"
-    valid_scopes(payload.scope)
-}
+def _normalize_prompt(user_prompt: str) -> str:
+    return " ".join(user_prompt.lower().split()).rstrip(".")
 
-valid_scopes(scopes) {
-    scopes[_] == "read:data"
-} {
-    scopes[_] == "write:data"
-}
 
----
+def _build_messages(user_prompt: str) -> list:
+    return [
+        SYSTEM_MSG_DICT,
+        {"role": "user", "content": USER_MSG_TEMPLATE.format(user_prompt=user_prompt)}
+    ]
 
-Example 6:
-Policy Description:
-Resource quota enforcement with tiered access:
-1. Free tier: max 5 resources, each <1GB
-2. Pro tier: max 50 resources, each <10GB
-3. Enterprise tier: unlimited
 
-REGO Policy:
-package quota
+def _clean_output(output: str) -> str:
+    # Strip reasoning blocks emitted by models such as deepseek-r1
+    return re.sub(r'<think>.*?</think>', '', output.strip(), flags=re.DOTALL).strip()
 
-import future.keywords.in
 
-default violation = null
+# Cached results depend on the prompt prefix and sampling settings too, so
+# editing the examples or TEMPERATURE invalidates earlier entries
+_SYSTEM_MSG_HASH = hashlib.sha256(SYSTEM_MSG.encode()).hexdigest()
 
-violation["Free tier exceeded resource limit"] {
-    input.tier == "free"
-    count(input.resources) > 5
-}
 
-violation["Free tier exceeded size limit"] {
-    input.tier == "free"
-    resource := input.resources[_]
-    resource.size > 1000000000  # 1GB in bytes
-}
+def _cache_key(model: str, user_prompt: str) -> str:
+    parts = (model, str(TEMPERATURE), _SYSTEM_MSG_HASH, user_prompt)
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
 
-violation["Pro tier exceeded resource limit"] {
-    input.tier == "pro"
-    count(input.resources) > 50
-}
 
-violation["Pro tier exceeded size limit"] {
-    input.tier == "pro"
-    resource := input.resources[_]
-    resource.size > 10000000000  # 10GB in bytes
-}
+# In-memory response cache shared by all sessions of this process; entries
+# expire after RESULT_CACHE_TTL seconds and the least recently used are
+# evicted beyond RESULT_CACHE_MAX_ENTRIES.
+RESULT_CACHE_TTL = 3600
+RESULT_CACHE_MAX_ENTRIES = 256
 
----
 
-Example 7:
-Policy Description:
-Complex workflow approval requiring:
-1. At least 2 approvers from different teams
-2. No conflicts of interest (approver not in same team as requester)
-3. Budget under $10k OR CEO approval if over
+@st.cache_resource
+def _get_memory_cache():
+    return {"lock": threading.Lock(), "entries": OrderedDict()}
 
-REGO Policy:
-package workflow
 
-import future.keywords.in
+def _memory_cache_get(key: str):
+    cache = _get_memory_cache()
+    with cache["lock"]:
+        entry = cache["entries"].get(key)
+        if entry is None:
+            return None
+        expires_at, output = entry
+        if expires_at < time.monotonic():
+            del cache["entries"][key]
+            return None
+        cache["entries"].move_to_end(key)
+        return output
 
-default approved = false
 
-approved {
-    count(input.approvals) >= 2
-    different_team_approvals
-    no_conflicts_of_interest
-    valid_budget
-}
+def _memory_cache_set(key: str, output: str) -> None:
+    cache = _get_memory_cache()
+    with cache["lock"]:
+        cache["entries"][key] = (time.monotonic() + RESULT_CACHE_TTL, output)
+        cache["entries"].move_to_end(key)
+        while len(cache["entries"]) > RESULT_CACHE_MAX_ENTRIES:
+            cache["entries"].popitem(last=False)
 
-different_team_approvals {
-    approver1 := input.approvals[_]
-    approver2 := input.approvals[_]
-    approver1 != approver2
-    approver1.team != approver2.team
-}
 
-no_conflicts_of_interest {
-    not input.approvals[_].team == input.requester.team
-}
+# On-disk response cache so generations survive server restarts. Rows older
+# than DISK_CACHE_TTL seconds are ignored and pruned, and only the newest
+# DISK_CACHE_MAX_ROWS are kept.
+_CACHE_PATH = Path(__file__).parent / ".rego_cache.sqlite3"
+_CACHE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS policies "
+    "(key TEXT PRIMARY KEY, output TEXT NOT NULL, created_at REAL NOT NULL)"
+)
+DISK_CACHE_TTL = 7 * 24 * 3600
+DISK_CACHE_MAX_ROWS = 1024
+
+
+def _disk_cache_get(key: str):
+    try:
+        with closing(sqlite3.connect(_CACHE_PATH)) as conn:
+            conn.execute(_CACHE_SCHEMA)
+            row = conn.execute(
+                "SELECT output FROM policies WHERE key = ? AND created_at >= ?",
+                (key, time.time() - DISK_CACHE_TTL)
+            ).fetchone()
+    except sqlite3.Error as e:  # unwritable dir, locked or corrupt DB: treat as a miss
+        warnings.warn(f"on-disk cache unavailable: {e}")
+        return None
+    return row[0] if row else None
+
+
+def _disk_cache_set(key: str, output: str) -> None:
+    now = time.time()
+    try:
+        with closing(sqlite3.connect(_CACHE_PATH)) as conn, conn:
+            conn.execute(_CACHE_SCHEMA)
+            conn.execute(
+                "INSERT OR REPLACE INTO policies (key, output, created_at) VALUES (?, ?, ?)",
+                (key, output, now)
+            )
+            conn.execute("DELETE FROM policies WHERE created_at < ?", (now - DISK_CACHE_TTL,))
+            conn.execute(
+                "DELETE FROM policies WHERE key NOT IN "
+                "(SELECT key FROM policies ORDER BY created_at DESC LIMIT ?)",
+                (DISK_CACHE_MAX_ROWS,)
+            )
+    except sqlite3.Error as e:
+        warnings.warn(f"on-disk cache unavailable: {e}")
+
+
+# Semantic cache: paraphrased descriptions ("allow admins" / "permit admin
+# role") reuse an earlier generation when their embeddings are close enough.
+# Entries share the in-memory cache's limits: RESULT_CACHE_MAX_ENTRIES per
+# model, each kept for RESULT_CACHE_TTL seconds.
+SEMANTIC_CACHE_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+SEMANTIC_CACHE_THRESHOLD = 0.95
+
+
+@st.cache_resource
+def _get_semantic_cache():
+    try:
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer(SEMANTIC_CACHE_MODEL)
+    except Exception:  # not installed, or the model can't be fetched/loaded
+        return None
+    return {
+        "encoder": encoder,
+        "lock": threading.Lock(),
+        # Per LLM model: (expires_at, unit-norm embedding, output) entries,
+        # oldest first, and their embeddings stacked for search (rebuilt
+        # lazily after the entries change)
+        "entries": {},
+        "matrix": {},
+    }
+
+
+def _embed(cache, user_prompt: str):
+    return cache["encoder"].encode([user_prompt], normalize_embeddings=True)[0]
+
+
+def _semantic_cache_get(cache, model: str, embedding):
+    import numpy as np
+
+    with cache["lock"]:
+        entries = cache["entries"].get(model)
+        if not entries:
+            return None
+        now = time.monotonic()
+        while entries and entries[0][0] < now:
+            entries.popleft()
+            cache["matrix"][model] = None
+        if not entries:
+            return None
+        if cache["matrix"].get(model) is None:
+            cache["matrix"][model] = np.stack([e[1] for e in entries])
+        # Inner product of unit vectors is cosine similarity
+        scores = cache["matrix"][model] @ embedding
+        best = int(scores.argmax())
+        if scores[best] >= SEMANTIC_CACHE_THRESHOLD:
+            return entries[best][2]
+    return None
+
+
+def _semantic_cache_set(cache, model: str, embedding, output: str) -> None:
+    with cache["lock"]:
+        entries = cache["entries"].setdefault(model, deque(maxlen=RESULT_CACHE_MAX_ENTRIES))
+        entries.append((time.monotonic() + RESULT_CACHE_TTL, embedding, output))
+        cache["matrix"][model] = None
+
+
+def _exact_cache_get(key: str):
+    """Look ``key`` up in the memory cache, then on disk."""
+    output = _memory_cache_get(key)
+    if output is None:
+        output = _disk_cache_get(key)
+        if output is not None:
+            _memory_cache_set(key, output)
+    return output
+
+
+def _prompt_embedding(user_prompt: str):
+    """Return the semantic cache and the prompt's embedding, or ``(None, None)``."""
+    semantic_cache = _get_semantic_cache()
+    if semantic_cache is None:
+        return None, None
+    return semantic_cache, _embed(semantic_cache, user_prompt)
+
+
+def _semantic_lookup(key: str, model: str, semantic_cache, embedding):
+    if semantic_cache is None:
+        return None
+    output = _semantic_cache_get(semantic_cache, model, embedding)
+    if output is not None:
+        _memory_cache_set(key, output)
+    return output
+
+
+def _cache_store(key: str, model: str, output: str, semantic_cache, embedding) -> None:
+    _memory_cache_set(key, output)
+    _disk_cache_set(key, output)
+    if semantic_cache is not None:
+        _semantic_cache_set(semantic_cache, model, embedding, output)
+
+
+def _stream_rego(model: str, user_prompt: str, user: str, on_token=None) -> str:
+    """Request a completion from Groq, calling ``on_token`` with the text so far."""
+    chat_completion = get_groq_client().chat.completions.create(
+        model=model,
+        messages=_build_messages(user_prompt),
+        temperature=TEMPERATURE,
+        stream=True,
+        user=user
+    )
+    buf = []
+    for chunk in chat_completion:
+        delta = chunk.choices[0].delta.content or ""
+        buf.append(delta)
+        if on_token is not None:
+            on_token("".join(buf))
+    return _clean_output("".join(buf))
+
+
+def generate_rego(model: str, user_prompt: str, user: str, on_token=None) -> str:
+    """Generate a REGO policy; identical (model, prompt) pairs are served from cache.
+
+    ``user`` is a stable per-session id sent as the request's ``user`` field
+    so the provider can route repeated prefixes to the same cache. On a cache
+    miss completion tokens are streamed as they arrive and ``on_token`` is
+    called with the text generated so far; cache hits return without calling
+    it. Results are kept in memory and persisted to disk, so a server restart
+    does not force regeneration, and, when sentence-transformers is
+    installed, near-duplicate descriptions are answered from the semantic
+    cache.
+    """
+    key = _cache_key(model, user_prompt)
+    cached = _exact_cache_get(key)
+    if cached is not None:
+        return cached
+
+    semantic_cache, embedding = _prompt_embedding(user_prompt)
+    cached = _semantic_lookup(key, model, semantic_cache, embedding)
+    if cached is not None:
+        return cached
+
+    output = _stream_rego(model, user_prompt, user, on_token)
+    _cache_store(key, model, output, semantic_cache, embedding)
+    return output
+
+
+async def generate_rego_many(models: list, user_prompt: str, user: str) -> list:
+    """Generate a REGO policy with each model concurrently; results follow ``models`` order.
+
+    Each model is looked up in the same cache layers as generate_rego; the
+    misses are sent as one batch, so the wait is the slowest model rather
+    than the sum of all of them. Results are not streamed. A model whose
+    request fails gets the exception in its slot; the others are still
+    cached and returned.
+    """
+    keys = [_cache_key(model, user_prompt) for model in models]
+    outputs = [_exact_cache_get(key) for key in keys]
+    if all(output is not None for output in outputs):
+        return outputs
+
+    semantic_cache, embedding = _prompt_embedding(user_prompt)
+    for i, model in enumerate(models):
+        if outputs[i] is None:
+            outputs[i] = _semantic_lookup(keys[i], model, semantic_cache, embedding)
+    missing = [i for i, output in enumerate(outputs) if output is None]
+    if not missing:
+        return outputs
+
+    # The async client is scoped to the running event loop: asyncio.run()
+    # closes its loop on exit, so a client cached across reruns would hold
+    # pooled connections bound to a dead loop.
+    from groq import AsyncGroq
+
+    messages = _build_messages(user_prompt)
+    async with AsyncGroq(api_key=_config().groq_api_key) as aclient:
+        completions = await asyncio.gather(*[
+            aclient.chat.completions.create(
+                model=models[i],
+                messages=messages,
+                temperature=TEMPERATURE,
+                user=user
+            )
+            for i in missing
+        ], return_exceptions=True)
+    for i, completion in zip(missing, completions):
+        if isinstance(completion, Exception):
+            outputs[i] = completion
+            continue
+        outputs[i] = _clean_output(completion.choices[0].message.content)
+        _cache_store(keys[i], models[i], outputs[i], semantic_cache, embedding)
+    return outputs
+
+
+def render_sidebar():
+    """Render the sidebar; returns the selected model and any comparison models."""
+    with st.sidebar:
+        st.image("https://www.openpolicyagent.org/img/logos/integrations/opa-golang.png", width=150)
+        selected_model = st.selectbox("Choose a Model", MODEL_OPTIONS, key="selected_model")
+        compare_models = st.multiselect(
+            "Compare with",
+            [m for m in MODEL_OPTIONS if m != selected_model],
+            help="Also generate with these models, side by side",
+            key="compare_models"
+        )
+        st.markdown("---")
+        st.write("AI-powered OPA REGO policy generator")
+        st.markdown("---")
+        st.caption("Tip: Be specific in your policy description for better results")
+    return selected_model, compare_models
+
+
+def render_analysis(output: str) -> None:
+    """Render the Policy Analysis expander for a generated policy."""
+    counts = Counter(m.group() for m in _ANALYSIS_RE.finditer(output))
+    with st.expander("🔍 Policy Analysis"):
+        st.markdown("**Key Features:**")
+        st.markdown("- Default deny: ✅" if counts["default allow = false"] else "- Default deny: ❌")
+        st.markdown("- Package declared: ✅" if counts["package "] else "- Package declared: ❌")
+        st.markdown("- Conditions: " + str(counts["input."]) + " input checks")
+        st.markdown("- Future keywords: ✅" if counts["future.keywords"] else "- Future keywords: ❌")
+        st.markdown("- JWT handling: ✅" if counts["io.jwt"] else "- JWT handling: ❌")
+        st.markdown("- Time-based: ✅" if counts["time.now_ns"] else "- Time-based: ❌")
 
-valid_budget {
-    input.budget <= 10000
-} {
-    input.budget > 10000
-    input.approvals[_].title == "CEO"
-}
-"""
 
 # Streamlit Dark Theme
 st.set_page_config(
@@ -208,32 +479,22 @@ st.set_page_config(
     layout="wide"
 )
 
-# CSS for dark theme 
-st.markdown("""
-<style>
-    [your existing CSS]
-</style>
-""", unsafe_allow_html=True)
-
 # UI
 st.title("REGO X")
 
-with st.sidebar:
-    st.image("https://www.openpolicyagent.org/img/logos/integrations/opa-golang.png", width=150)
-    selected_model = st.selectbox("Choose a Model", MODEL_OPTIONS)
-    st.markdown("---")
-    st.write("AI-powered OPA REGO policy generator")
-    st.markdown("---")
-    st.caption("Tip: Be specific in your policy description for better results")
+selected_model, compare_models = render_sidebar()
 
-# User input
+# User input; widget values live in session state so reruns triggered by
+# other widgets keep them without extra work
+st.session_state.setdefault("user_prompt", "")
 col1, col2 = st.columns([3, 1])
 with col1:
     user_prompt = st.text_area(
         "Describe the policy you want:",
         height=200,
         placeholder="Example: 'Allow access only to users with admin role from internal IPs during business hours'",
-        help="Be as specific as possible about conditions and requirements"
+        help="Be as specific as possible about conditions and requirements",
+        key="user_prompt"
     )
 
 # with col2:
@@ -243,60 +504,54 @@ with col1:
 #     st.caption("'Limit container resources based on team quota'")
 
 if st.button("Generate REGO Policy", type="primary"):
+    local_policy = LOCAL_POLICIES.get(_normalize_prompt(user_prompt))
     if not user_prompt.strip():
         st.warning("Please enter a policy description.")
+    elif local_policy is None and len(user_prompt.strip()) < MIN_PROMPT_LENGTH:
+        st.warning("Please describe the policy in more detail.")
     else:
-        with st.spinner("Generating REGO Policy..."):
-            # Full prompt with few-shot
-            full_prompt = f"""
-You are a cybersecurity expert specializing in Open Policy Agent (OPA) and REGO policies.
-
-Use the following examples to understand the style and structure.
-
-{few_shot_examples}
-
-Now, based on this new Policy Description, generate a REGO policy.
-Follow these guidelines:
-1. Include proper package declaration
-2. Set default allow = false when appropriate
-3. Use clear, descriptive rule names
-4. Include all necessary conditions
-5. Format for readability
-
-Only output the REGO code block. No explanation, no extra text and diplsaying your thinking.
-
-Policy Description:
-\"\"\"
-{user_prompt}
-\"\"\"
-"""
-
-            chat_completion = client.chat.completions.create(
-                model=selected_model,
-                messages=[
-                    {"role": "system", "content": "You are an expert REGO policy writer. Output only valid REGO code."},
-                    {"role": "user", "content": full_prompt}
-                ],
-                temperature=0.2
-            )
-            output = chat_completion.choices[0].message.content.strip()
-            output = re.sub(r'<think>.*?</think>', '', output, flags=re.DOTALL).strip()
-
-
         st.subheader("Generated REGO Policy:")
-        
-        
-        st.code(output, language="rego", line_numbers=True)
-        
-        st.session_state["generated_rego"] = output
-        st.toast("Policy generated successfully!", icon="✅")
-
-        # Policy analysis
-        with st.expander("🔍 Policy Analysis"):
-            st.markdown("**Key Features:**")
-            st.markdown("- Default deny: ✅" if "default allow = false" in output else "- Default deny: ❌")
-            st.markdown("- Package declared: ✅" if "package " in output else "- Package declared: ❌")
-            st.markdown("- Conditions: " + str(output.count("input.")) + " input checks")
+        session_id = st.session_state.setdefault("_sid", uuid.uuid4().hex)
+
+        if local_policy is not None:
+            output = local_policy
+            st.info("Built-in template used for this common policy; no model was called.")
+            if compare_models:
+                for tab in st.tabs([selected_model] + compare_models):
+                    with tab:
+                        st.code(output, language="rego", line_numbers=True)
+            else:
+                st.code(output, language="rego", line_numbers=True)
+        elif compare_models:
+            # All models, including the selected one, go out in one batch
+            models = [selected_model] + compare_models
+            with st.spinner("Generating REGO Policies..."):
+                outputs = asyncio.run(generate_rego_many(models, user_prompt.strip(), session_id))
+            for tab, model, model_output in zip(st.tabs(models), models, outputs):
+                with tab:
+                    if isinstance(model_output, Exception):
+                        st.error(f"{model} failed: {model_output}")
+                    else:
+                        st.code(model_output, language="rego", line_numbers=True)
+            output = None if isinstance(outputs[0], Exception) else outputs[0]
+        else:
+            placeholder = st.empty()
+
+            with st.spinner("Generating REGO Policy..."):
+                output = generate_rego(
+                    selected_model,
+                    user_prompt.strip(),
+                    user=session_id,
+                    on_token=lambda text: placeholder.code(text, language="rego")
+                )
+
+            placeholder.code(output, language="rego", line_numbers=True)
+
+        if output is not None:
+            st.session_state["generated_rego"] = output
+            st.toast("Policy generated successfully!", icon="✅")
+
+            render_analysis(output)
 
 # Download button
 if "generated_rego" in st.session_state:
@@ -0,0 +1,15 @@
+import functools
+import sys
+from pathlib import Path
+from unittest import mock
+
+# app.py builds its UI at import time; stub streamlit so the module imports
+# outside `streamlit run`. cache_resource memoizes like the real decorator.
+st = mock.MagicMock()
+st.cache_resource = lambda func: functools.lru_cache(maxsize=None)(func)
+st.button.return_value = False
+st.columns.return_value = (mock.MagicMock(), mock.MagicMock())
+st.session_state = {}
+sys.modules["streamlit"] = st
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
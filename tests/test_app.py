@@ -0,0 +1,121 @@
+import hashlib
+import itertools
+import time
+from collections import Counter
+
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def empty_memory_cache():
+    app._get_memory_cache()["entries"].clear()
+    yield
+    app._get_memory_cache()["entries"].clear()
+
+
+@pytest.fixture
+def disk_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "_CACHE_PATH", tmp_path / "cache.sqlite3")
+
+
+def test_memory_cache_roundtrip():
+    app._memory_cache_set("k", "policy")
+    assert app._memory_cache_get("k") == "policy"
+    assert app._memory_cache_get("missing") is None
+
+
+def test_memory_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(app, "RESULT_CACHE_MAX_ENTRIES", 2)
+    app._memory_cache_set("a", "1")
+    app._memory_cache_set("b", "2")
+    app._memory_cache_get("a")
+    app._memory_cache_set("c", "3")
+    assert app._memory_cache_get("a") == "1"
+    assert app._memory_cache_get("b") is None
+    assert app._memory_cache_get("c") == "3"
+
+
+def test_memory_cache_expires(monkeypatch):
+    monkeypatch.setattr(app, "RESULT_CACHE_TTL", -1)
+    app._memory_cache_set("k", "policy")
+    assert app._memory_cache_get("k") is None
+
+
+def test_disk_cache_roundtrip(disk_cache):
+    app._disk_cache_set("k", "policy")
+    assert app._disk_cache_get("k") == "policy"
+    assert app._disk_cache_get("missing") is None
+
+
+def test_disk_cache_expires(disk_cache, monkeypatch):
+    app._disk_cache_set("k", "policy")
+    monkeypatch.setattr(app, "DISK_CACHE_TTL", -1)
+    assert app._disk_cache_get("k") is None
+
+
+def test_disk_cache_keeps_newest_rows(disk_cache, monkeypatch):
+    monkeypatch.setattr(app, "DISK_CACHE_MAX_ROWS", 2)
+    clock = itertools.count(time.time())
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    for key in ("a", "b", "c"):
+        app._disk_cache_set(key, key.upper())
+    assert app._disk_cache_get("a") is None
+    assert app._disk_cache_get("b") == "B"
+    assert app._disk_cache_get("c") == "C"
+
+
+def test_disk_cache_errors_are_misses(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "_CACHE_PATH", tmp_path / "missing" / "cache.sqlite3")
+    with pytest.warns(UserWarning):
+        app._disk_cache_set("k", "policy")
+    with pytest.warns(UserWarning):
+        assert app._exact_cache_get("k") is None
+
+
+def test_cache_key_depends_on_prompt_prefix_and_temperature(monkeypatch):
+    key = app._cache_key("model", "allow admins")
+    assert app._cache_key("model", "allow admins") == key
+    assert app._cache_key("other-model", "allow admins") != key
+
+    monkeypatch.setattr(app, "TEMPERATURE", 0.7)
+    assert app._cache_key("model", "allow admins") != key
+
+    monkeypatch.undo()
+    edited = hashlib.sha256((app.SYSTEM_MSG + "\nExample 8").encode()).hexdigest()
+    monkeypatch.setattr(app, "_SYSTEM_MSG_HASH", edited)
+    assert app._cache_key("model", "allow admins") != key
+
+
+@pytest.mark.parametrize("prompt", ["allow admins", "  Allow   ADMINS. ", "Allow access to users with the role \"admin\"."])
+def test_normalize_prompt_matches_local_policies(prompt):
+    assert app.LOCAL_POLICIES.get(app._normalize_prompt(prompt)) == app._ADMIN_POLICY
+
+
+def test_normalize_prompt_leaves_other_prompts_unmatched():
+    assert app._normalize_prompt("Allow admins from internal IPs") not in app.LOCAL_POLICIES
+
+
+def test_analysis_counts():
+    policy = """package jwt_authz
+
+import future.keywords.in
+
+default allow = false
+
+allow {
+    io.jwt.decode(input.jwt)
+    input.user.role == "admin"
+    time.now_ns() < input.expiry
+}
+"""
+    counts = Counter(m.group() for m in app._ANALYSIS_RE.finditer(policy))
+    assert counts == {
+        "package ": 1,
+        "future.keywords": 1,
+        "default allow = false": 1,
+        "io.jwt": 1,
+        "input.": 3,
+        "time.now_ns": 1,
+    }